@@ -20,20 +20,26 @@ Commands Supported:
     - shutdown: Gracefully shutdown the plugin
 
 Dependencies:
-    - pyautogui: For taking screenshots
+    - mss: For taking screenshots of the active monitor
+    - Pillow: For encoding screenshots
     - requests: For making HTTP requests to Replicate API
+    - orjson: For fast JSON serialization
     - ctypes: For Windows pipe communication
 """
 import json
 import logging
 import os
 import sys
-from typing import Optional, Dict, Any
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Optional, Dict, Any, Callable
+from ctypes import byref, create_string_buffer, windll, wintypes
 import requests
-from ctypes import byref, windll, wintypes
-import pyautogui
-import requests
-import base64
+from requests.adapters import HTTPAdapter
+import mss
+import orjson
+from PIL import Image
 import io
 
 # Type definitions
@@ -62,29 +68,64 @@ CONFIG_FILE = os.path.join(
 LOG_FILE = os.path.join(os.environ.get("USERPROFILE", "."), 'visual.log')
 """Path to log file for plugin operations."""
 
+LOG_LEVEL = os.environ.get("VISUAL_LOG_LEVEL", "WARNING").upper()
+"""Logging level name; set VISUAL_LOG_LEVEL=INFO or DEBUG for more detail."""
+
 # Replicate ai
 REPLICATE_ENDPOINT = "https://api.replicate.com/v1/predictions"
 """Replicate api endpoint"""
 
+REPLICATE_FILES_ENDPOINT = "https://api.replicate.com/v1/files"
+"""Replicate file upload endpoint"""
+
 REPLICATE_AI_PATH = "bf57361c75677fc33d480d0c5f02926e621b2caa2000347cb74aeae9d2ca07ee"
 """Replicate Ai for asking things about the screen"""
 
+JPEG_QUALITY = 85
+"""JPEG quality used when encoding screenshots sent to Replicate."""
+
+MAX_IMAGE_SIZE = (1280, 1280)
+"""Bounding box screenshots are downscaled to; qwen2-vl resizes larger images anyway."""
+
+MAX_WORKERS = 4
+"""Maximum number of tool calls processed concurrently."""
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+"""Worker pool tool calls are dispatched to so their network round-trips overlap."""
+
+_local = threading.local()
+"""Per-thread state; holds the reusable buffer the encoded screenshot is written to."""
+
+_session = requests.Session()
+"""Persistent HTTP session so the TLS connection to Replicate is reused between calls."""
+_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_WORKERS))
+
 config: Dict[str, str] = {}
 """Loaded configuration containing Replicate API credentials."""
 
+_UPLOAD_HEADERS: Dict[str, str] = {}
+"""Headers for Replicate file uploads, built once the config is loaded."""
+
+_HEADERS: Dict[str, str] = {}
+"""Headers for Replicate predictions, built once the config is loaded."""
+
 def setup_logging() -> None:
     """Configure logging with appropriate format and level.
     
-    Sets up the logging configuration with file output, INFO level, and timestamp format.
-    The log file location is determined by LOG_FILE constant.
+    Sets up the logging configuration with file output, level, and timestamp format.
+    The log file location is determined by LOG_FILE constant and the level by
+    LOG_LEVEL, falling back to WARNING if it is not a valid level name.
     
     Log Format:
         %(asctime)s - %(levelname)s - %(message)s
         Example: 2024-03-14 12:34:56,789 - INFO - Plugin initialized
     """
+    level = logging.getLevelName(LOG_LEVEL)
+    if not isinstance(level, int):
+        level = logging.WARNING
     logging.basicConfig(
         filename=LOG_FILE,
-        level=logging.INFO,
+        level=level,
         format="%(asctime)s - %(levelname)s - %(message)s"
     )
 
@@ -108,7 +149,7 @@ def load_config() -> Dict[str, str]:
             with open(CONFIG_FILE, "r") as file:
                 return json.load(file)
     except Exception as e:
-        logging.error(f"Error loading config: {e}")
+        logging.error("Error loading config: %s", e)
     return {}
 
 def save_config(config_data: Dict[str, str]) -> None:
@@ -121,7 +162,7 @@ def save_config(config_data: Dict[str, str]) -> None:
         with open(CONFIG_FILE, "w") as file:
             json.dump(config_data, file, indent=4)
     except Exception as e:
-        logging.error(f"Error saving config: {e}")
+        logging.error("Error saving config: %s", e)
 
 def generate_response(success: bool, message: Optional[str] = None) -> Response:
     """Generate a standardized response dictionary.
@@ -138,11 +179,113 @@ def generate_response(success: bool, message: Optional[str] = None) -> Response:
         response['message'] = message
     return response
 
-def describe_screen(params: Dict[str, str]) -> Response:
+def get_active_monitor(sct: mss.base.MSSBase) -> Dict[str, int]:
+    """Find the monitor containing the foreground window.
+    
+    Args:
+        sct (mss.base.MSSBase): Open mss instance used to enumerate monitors.
+    
+    Returns:
+        Dict[str, int]: mss monitor dictionary ('left', 'top', 'width', 'height')
+                        of the monitor holding the center of the foreground window,
+                        or the primary monitor if it cannot be determined.
+    """
+    monitors = sct.monitors[1:]
+    hwnd = windll.user32.GetForegroundWindow()
+    rect = wintypes.RECT()
+    if hwnd and windll.user32.GetWindowRect(hwnd, byref(rect)):
+        center_x = (rect.left + rect.right) // 2
+        center_y = (rect.top + rect.bottom) // 2
+        for monitor in monitors:
+            if (monitor["left"] <= center_x < monitor["left"] + monitor["width"]
+                    and monitor["top"] <= center_y < monitor["top"] + monitor["height"]):
+                return monitor
+    return monitors[0]
+
+def capture_screen() -> Image.Image:
+    """Take a screenshot of the active monitor.
+    
+    Only the monitor holding the foreground window is captured rather than
+    the whole virtual desktop, which keeps the image small on multi-monitor setups.
+    The screenshot is downscaled to fit within MAX_IMAGE_SIZE.
+    
+    Returns:
+        Image.Image: RGB screenshot of the active monitor.
+    """
+    with mss.mss() as sct:
+        raw = sct.grab(get_active_monitor(sct))
+    # Decode mss's own BGRA bytearray; raw.rgb and raw.bgra would each build another
+    # full-frame copy first. The frame is still copied once into the PIL image.
+    screenshot = Image.frombuffer("RGB", raw.size, raw.raw, "raw", "BGRX", 0, 1)
+    screenshot.thumbnail(MAX_IMAGE_SIZE, Image.Resampling.LANCZOS)
+    return screenshot
+
+def upload_screen() -> Dict[str, Any]:
+    """Capture the active monitor and upload it to Replicate.
+    
+    The screenshot is JPEG-encoded into a per-thread reusable buffer and sent
+    as binary to the Replicate files API. The uploaded file must be removed
+    with delete_upload once it is no longer needed.
+    
+    Returns:
+        Dict[str, Any]: Replicate file object; 'id' identifies the file and
+                        'urls' -> 'get' is the URL usable as model input.
+    
+    Raises:
+        requests.RequestException: If the upload fails.
+        orjson.JSONDecodeError: If the upload response is not valid JSON.
+    """
+    image = capture_screen()
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate(0)
+    image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=False)
+    # getbuffer() is a zero-copy view; it must be released before the next truncate.
+    with buffer.getbuffer() as img_bytes:
+        upload = _session.post(
+            REPLICATE_FILES_ENDPOINT,
+            headers=_UPLOAD_HEADERS,
+            files={
+                "content": ("screen.jpg", img_bytes, "image/jpeg")
+            }
+        )
+    upload.raise_for_status()
+    return orjson.loads(upload.content)
+
+def delete_upload(upload: Dict[str, Any]) -> None:
+    """Delete a screenshot uploaded by upload_screen from Replicate.
+    
+    Args:
+        upload (Dict[str, Any]): Replicate file object returned by upload_screen.
+    
+    Note:
+        Errors are logged but not raised.
+    """
+    file_id = upload.get("id")
+    if not file_id:
+        logging.error("Uploaded screenshot has no file id, cannot delete it")
+        return
+    try:
+        response = _session.delete(
+            f"{REPLICATE_FILES_ENDPOINT}/{file_id}",
+            headers=_UPLOAD_HEADERS
+        )
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logging.error("Error deleting uploaded screenshot %s: %s", file_id, e)
+
+def describe_screen(params: Dict[str, str],
+                    media: Optional["Future[Dict[str, Any]]"] = None) -> Response:
     """Describe the users screen.
     
     Args:
         params (Dict[str, str]): Dictionary containing 'prompt' key with the screen question.
+        media (Optional[Future[Dict[str, Any]]]): Screenshot uploaded when the command
+            arrived, shared by every describe_screen call in the command and deleted
+            by the caller. If not provided, the screen is captured, uploaded and
+            deleted here.
     
     Returns:
         Response: Dictionary containing:
@@ -151,46 +294,53 @@ def describe_screen(params: Dict[str, str]) -> Response:
                       or error message if check failed.
 
     """
-    global config
     prompt = params.get("prompt")
     
     if not prompt:
         return generate_response(False, "Missing required parameter: prompt")
     
+    if not config.get('REPLICATE_KEY'):
+        return generate_response(False, "Missing REPLICATE_KEY in config.json")
+    
+    uploaded = None
     try:
-        if(config.get('REPLICATE_KEY') is None):
-            config = load_config()
-        screenshot = pyautogui.screenshot()
-        buffer = io.BytesIO()
-        screenshot.save(buffer, format="PNG")
-        buffer.seek(0)
-        img_bytes = buffer.read()
-        img_base64 = base64.b64encode(img_bytes).decode("utf-8")
-        file_input = f"data:image/png;base64,{img_base64}"
+        if media is not None:
+            upload = media.result()
+        else:
+            upload = uploaded = upload_screen()
+        media_url = (upload.get("urls") or {}).get("get")
+        if not media_url:
+            return generate_response(False, "Failed to upload screenshot")
         input = {
-            "media": file_input,
+            "media": media_url,
             "prompt": prompt
         }
       
-        response = requests.post(
+        response = _session.post(
             REPLICATE_ENDPOINT,
-            headers={
-                "Authorization": f"Bearer {config.get('REPLICATE_KEY')}",
-                "Content-Type": "application/json",
-                "Prefer": "wait"
-            },
-            json={
+            headers=_HEADERS,
+            data=orjson.dumps({
                 "version": REPLICATE_AI_PATH,
                 "input": input
-            }
+            })
         )
-        output = response.json()
-        res = output['output']
+        response.raise_for_status()
+        output = orjson.loads(response.content)
+        # Prefer: wait still returns 201 when the prediction failed or timed out.
+        status = output.get("status")
+        if status != "succeeded":
+            logging.error("Prediction %s: %s", status, output.get("error"))
+            return generate_response(False, f"Failed to check Screen Description: {output.get('error') or status}")
+        res = output.get('output')
         
         return generate_response(True, f"{res}")
     
-    except requests.RequestException as e:
+    except (requests.RequestException, orjson.JSONDecodeError) as e:
+        logging.error("Error describing screen: %s", e)
         return generate_response(False, "Failed to check Screen Description")
+    finally:
+        if uploaded is not None:
+            delete_upload(uploaded)
 
 def read_command() -> Optional[Dict[str, Any]]:
     """Read command from stdin pipe.
@@ -218,10 +368,10 @@ def read_command() -> Optional[Dict[str, Any]]:
     try:
         pipe = windll.kernel32.GetStdHandle(STD_INPUT_HANDLE)
         chunks = []
+        buffer = create_string_buffer(BUFFER_SIZE)
+        message_bytes = wintypes.DWORD()
         
         while True:
-            message_bytes = wintypes.DWORD()
-            buffer = bytes(BUFFER_SIZE)
             success = windll.kernel32.ReadFile(
                 pipe,
                 buffer,
@@ -234,22 +384,22 @@ def read_command() -> Optional[Dict[str, Any]]:
                 logging.error('Error reading from command pipe')
                 return None
 
-            chunk = buffer.decode('utf-8')[:message_bytes.value]
-            chunks.append(chunk)
+            chunks.append(buffer[:message_bytes.value])
 
             if message_bytes.value < BUFFER_SIZE:
                 break
 
-        retval = ''.join(chunks)
-        logging.info(f'Raw Input: {retval}')
-        return json.loads(retval)
+        retval = b''.join(chunks)
+        logging.info('Raw Input: %d bytes', len(retval))
+        logging.debug('Raw Input: %s', retval)
+        return orjson.loads(retval)
         
-    except json.JSONDecodeError:
-        logging.error(f'Received invalid JSON: {retval}')
+    except orjson.JSONDecodeError:
+        logging.error('Received invalid JSON: %s', retval)
         logging.exception("JSON decoding failed:")
         return None
     except Exception as e:
-        logging.error(f'Exception in read_command(): {e}')
+        logging.error('Exception in read_command(): %s', e)
         return None
 
 def write_response(response: Response) -> None:
@@ -267,8 +417,8 @@ def write_response(response: Response) -> None:
     """
     try:
         pipe = windll.kernel32.GetStdHandle(STD_OUTPUT_HANDLE)
-        json_message = json.dumps(response) + '<<END>>'
-        message_bytes = json_message.encode('utf-8')
+        # json.dumps escapes non-ASCII, which is what the host has always received.
+        message_bytes = json.dumps(response).encode('utf-8') + b'<<END>>'
         
         bytes_written = wintypes.DWORD()
         windll.kernel32.WriteFile(
@@ -279,7 +429,7 @@ def write_response(response: Response) -> None:
             None
         )
     except Exception as e:
-        logging.error(f'Error writing response: {e}')
+        logging.error('Error writing response: %s', e)
 
 def initialize() -> Response:
     """Initialize the plugin.
@@ -303,18 +453,55 @@ def shutdown() -> Response:
     logging.info("Shutting down plugin")
     return generate_response(True, "Plugin shutdown successfully")
 
+Handler = Callable[[Dict[str, Any], Optional["Future[Dict[str, Any]]"]], Response]
+"""Type alias for a tool call handler taking params and the uploaded screenshot."""
+
+HANDLERS: Dict[str, Handler] = {
+    "initialize": lambda params, media: initialize(),
+    "describe_screen": describe_screen,
+    "shutdown": lambda params, media: shutdown(),
+}
+"""Mapping of tool call function names to their handlers."""
+
+def execute_tool_call(tool_call: Dict[str, Any],
+                      media: Optional["Future[Dict[str, Any]]"] = None) -> Response:
+    """Route a single tool call to its handler.
+    
+    Args:
+        tool_call (Dict[str, Any]): Tool call containing 'func' and optional 'params'.
+        media (Optional[Future[Dict[str, Any]]]): Screenshot uploaded for this command.
+    
+    Returns:
+        Response: Response produced by the handler, or an error response
+                  if the function is unknown or the handler raised.
+    
+    Note:
+        Handler exceptions, including screen capture errors re-raised from the
+        prefetched upload, are logged and turned into an error response so they
+        never escape the worker pool and stop the main loop.
+    """
+    func = tool_call.get("func")
+    handler = HANDLERS.get(func)
+    if handler is None:
+        return generate_response(False, "Unknown function call")
+    try:
+        return handler(tool_call.get("params", {}), media)
+    except Exception:
+        logging.exception("Exception in %s():", func)
+        return generate_response(False, f"Failed to run {func}")
+
 def main() -> None:
     """Main plugin loop.
     
-    Sets up logging and enters main command processing loop.
+    Sets up logging, loads the configuration once and enters main command processing loop.
     Handles incoming commands and routes them to appropriate handlers.
     Continues running until shutdown command is received.
     
     Command Processing Flow:
         1. Read command from pipe
         2. Parse command and parameters
-        3. Route to appropriate handler
-        4. Write response back to pipe
+        3. Route tool calls to their handlers concurrently
+        4. Write responses back to pipe in order
         5. Repeat until shutdown command
     
     Error Handling:
@@ -322,9 +509,21 @@ def main() -> None:
         - Failed command reads are logged and loop continues
         - Shutdown command exits loop gracefully
     """
+    global config
     setup_logging()
     logging.info("Visual Plugin Started")
     
+    config = load_config()
+    if not config.get('REPLICATE_KEY'):
+        logging.error("REPLICATE_KEY not found in %s", CONFIG_FILE)
+    # Uploads leave Content-Type unset so requests can add the multipart boundary.
+    _UPLOAD_HEADERS["Authorization"] = f"Bearer {config.get('REPLICATE_KEY')}"
+    _HEADERS.update({
+        "Authorization": _UPLOAD_HEADERS["Authorization"],
+        "Content-Type": "application/json",
+        "Prefer": "wait"
+    })
+    
     while True:
         command = read_command()
         if command is None:
@@ -332,23 +531,34 @@ def main() -> None:
             continue
         
         tool_calls = command.get("tool_calls", [])
-        for tool_call in tool_calls:
-            func = tool_call.get("func")
-            params = tool_call.get("params", {})
-            
-            if func == "initialize":
-                response = initialize()
-            elif func == "describe_screen":
-                response = describe_screen(params)
-            elif func == "shutdown":
-                response = shutdown()
+        # Like the sequential loop, nothing after shutdown is run.
+        for index, tool_call in enumerate(tool_calls):
+            if tool_call.get("func") == "shutdown":
+                tool_calls = tool_calls[:index + 1]
+                break
+        
+        # Capture and upload the screen once as soon as the command arrives; every
+        # describe_screen call reuses the same file, which is deleted once all
+        # responses are written. It is queued ahead of the tool calls, so a worker
+        # is always free to run it.
+        media = None
+        if config.get('REPLICATE_KEY') and any(
+                tool_call.get("func") == "describe_screen"
+                and tool_call.get("params", {}).get("prompt")
+                for tool_call in tool_calls):
+            media = _executor.submit(upload_screen)
+        
+        # Tool calls run concurrently; responses are still written in request order.
+        responses = _executor.map(partial(execute_tool_call, media=media), tool_calls)
+        try:
+            for tool_call, response in zip(tool_calls, responses):
                 write_response(response)
-                return
-            else:
-                response = generate_response(False, "Unknown function call")
-            
-            write_response(response)
+                if tool_call.get("func") == "shutdown":
+                    _executor.shutdown(wait=False, cancel_futures=True)
+                    return
+        finally:
+            if media is not None and media.exception() is None:
+                delete_upload(media.result())
 
 if __name__ == "__main__":
-    config = load_config()
     main()